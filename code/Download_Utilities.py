@@ -2,6 +2,7 @@
 Download url to doc-string or file
   download_to_file(url, fname, f_log)
   doc = download_to_doc(url, f_log)
+  n_recovered, n_failed = replay_failures(failure_log)
 
 ND-SRAF / McDonald : 201606 | Last update: 202201
 https://sraf.nd.edu
@@ -9,10 +10,15 @@ https://sraf.nd.edu
 
 
 import datetime as dt
+import json
+import os
+import random
 import requests
 import sys
+import threading
 import time
-from urllib.request import urlopen
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 
 
 HEADER = {'Host': 'www.sec.gov', 'Connection': 'close',
@@ -20,32 +26,192 @@ HEADER = {'Host': 'www.sec.gov', 'Connection': 'close',
          'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.163 Safari/537.36',
          }
 
-def download_to_file(url, fname, f_log=None, number_of_tries=5, sleep_time=5):
-    # download file from '_url' and write to 'fname'
-    # Loop accounts for temporary server/ISP issues
+# Retry policy
+#   Throttling (429), server errors (5xx) and connection errors/timeouts are retried with exponential
+#   backoff and full jitter, honoring Retry-After when the server sends it.  EDGAR signals a
+#   rate-limit violation with 403, so a 403 from sec.gov is throttling too: it is retried and opens
+#   the circuit breaker for SEC_THROTTLE_COOLDOWN.  Other 4xx (e.g., 404) are permanent and fail
+#   immediately.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+SEC_THROTTLE_COOLDOWN = 600  # seconds; EDGAR blocks an over-limit client for about 10 minutes
+BACKOFF_BASE = 2  # seconds; delay before retry k is uniform on [0, min(BACKOFF_CAP, BACKOFF_BASE * 2**(k-1))]
+BACKOFF_CAP = 120
+REQUEST_TIMEOUT = 60  # seconds
+CHUNK_SIZE = 1 << 16  # bytes per write when streaming a filing to disk
+# Every URL that ultimately fails is appended here (one JSON record per line); see replay_failures()
+FAILURE_LOG_FILE = r'./result/EDGAR_Download_Failures.jsonl'
+
+
+class CircuitBreaker:
+    """
+    Shared by all downloads (threads) in the process.  When the server throttles us, or after
+      failure_threshold consecutive retryable failures, every caller pauses until the cooldown ends
+      instead of each one hammering the server on its own schedule.
+    """
+    def __init__(self, failure_threshold=5, cooldown=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.open_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self, retry_after=None):
+        with self.lock:
+            self.consecutive_failures += 1
+            pause = retry_after or 0
+            if self.consecutive_failures >= self.failure_threshold:
+                pause = max(pause, self.cooldown)
+                print(f'  Circuit breaker open: {self.consecutive_failures} consecutive failures, pausing {pause:.0f}s')
+            if pause:
+                self.open_until = max(self.open_until, time.monotonic() + pause)
+
+
+breaker = CircuitBreaker()
+_failure_log_lock = threading.Lock()
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Exponential backoff with full jitter (attempt = 1, 2, ...)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def parse_retry_after(value):
+    # Retry-After is either delay-seconds or an HTTP-date; returns seconds or None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_sec_url(url):
+    host = urlparse(url).hostname or ''
+    return host == 'sec.gov' or host.endswith('.sec.gov')
+
+
+def log_failure(url, fname=None, status=None, error=None, attempts=0, failure_log=FAILURE_LOG_FILE):
+    """Append one failed download to the structured failure log (JSON lines) for replay_failures()."""
+    if not failure_log:
+        return
+    record = {'url': url, 'fname': fname, 'status': status, 'error': error, 'attempts': attempts,
+              'time': dt.datetime.now().isoformat(timespec='seconds')}
+    with _failure_log_lock, open(failure_log, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+class IncompleteDownload(Exception):
+    """Body ended before Content-Length bytes arrived; retried like a dropped connection."""
 
-    for i in range(1, number_of_tries):
+
+def request_with_retry(url, number_of_tries=5, headers=None, on_response=None, **kwargs):
+    """
+    GET url under the retry policy.
+      headers: extra request headers, or a callable returning them (re-evaluated on each attempt).
+      on_response: called with each 200/206 response; connection errors or IncompleteDownload
+        raised while it reads the body are retried like failed requests.
+      Returns (response, None) on success, else (None, failure) where failure is a dict with the
+        last status/error and the number of attempts.
+    """
+    status = error = None
+    for i in range(1, number_of_tries + 1):
+        breaker.wait()
+        retry_after = None
         try:
-            response = requests.get(url, headers=HEADER)
-            if response.status_code == 200:
-                with open(fname, 'wb') as f:
-                    f.write(response.content)
-                return True
-            else:
-                print(f'  Error in try #{i} download_to_file: URL = {url} | status_code = {response.status_code}')
-                if i == number_of_tries + 1:
-                    print(f'  Failed download: URL = {url}')
-                    if f_log: f_log.write(f'  Failed download: URL = {url}\n')
-                
-        except Exception as exc:
-            if i == 1:
-                print('\n==>urlretrieve error in download_to_file.py')
-            print(f'  {i}.url  : {url} \n  fname: {fname} \n  exc:  {exc}')
-            if '404' in str(exc):
-                break
-            print(f'     Retry in {sleep_time} seconds')
-            time.sleep(sleep_time)
-            # sleep_time += sleep_time
+            extra = headers() if callable(headers) else headers
+            response = requests.get(url, headers={**HEADER, **(extra or {})}, timeout=REQUEST_TIMEOUT, **kwargs)
+            status, error = response.status_code, None
+            if status in (200, 206):
+                if on_response:
+                    with response:
+                        on_response(response)
+                breaker.record_success()
+                return response, None
+            print(f'  Error in try #{i}: URL = {url} | status_code = {status}')
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if status == 403 and is_sec_url(url):
+                retry_after = max(retry_after or 0, SEC_THROTTLE_COOLDOWN)
+                print(f'  SEC rate limit (403): pausing all downloads for {retry_after:.0f}s')
+            elif status not in RETRY_STATUS:
+                return None, {'status': status, 'error': None, 'attempts': i}
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                IncompleteDownload) as exc:
+            error = str(exc)
+            print(f'  Error in try #{i}: URL = {url} | {exc}  [{dt.datetime.now().strftime("%c")}]')
+        except requests.RequestException as exc:  # malformed URL etc. -- retrying won't help
+            print(f'  Error in try #{i}: URL = {url} | {exc}')
+            return None, {'status': None, 'error': str(exc), 'attempts': i}
+
+        breaker.record_failure(retry_after)
+        if i < number_of_tries:
+            delay = retry_after if retry_after is not None else backoff_delay(i)
+            print(f'     Retry in {delay:.1f} seconds')
+            time.sleep(delay)
+
+    return None, {'status': status, 'error': error, 'attempts': number_of_tries}
+
+
+def _stream_to_part(response, part):
+    # Append (206) or rewrite (200) the partial file, then check it against the expected total size
+    if response.status_code == 206:
+        mode = 'ab'
+        content_range = response.headers.get('Content-Range', '')  # bytes start-end/total
+        total = content_range.rsplit('/', 1)[-1]
+    else:
+        mode = 'wb'
+        total = response.headers.get('Content-Length')
+    with open(part, mode) as f:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            f.write(chunk)
+    size = os.path.getsize(part)
+    if total and total.isdigit() and size != int(total):
+        raise IncompleteDownload(f'{size:,} of {int(total):,} bytes')
+
+
+def download_to_file(url, fname, f_log=None, number_of_tries=5, failure_log=FAILURE_LOG_FILE):
+    # download file from '_url' and write to 'fname'
+    #   The body is streamed in chunks to fname + '.part' and renamed into place only once complete,
+    #   so fname never exists truncated.  A '.part' left by an interrupted attempt or run is resumed
+    #   with a Range request.
+
+    part = fname + '.part'
+
+    def resume_headers():
+        # Accept-Encoding identity so Content-Length/Range refer to the bytes written to disk
+        headers = {'Accept-Encoding': 'identity'}
+        if os.path.exists(part) and os.path.getsize(part):
+            headers['Range'] = f'bytes={os.path.getsize(part)}-'
+        return headers
+
+    def stream(response):
+        _stream_to_part(response, part)
+
+    response, failure = request_with_retry(url, number_of_tries, headers=resume_headers, on_response=stream,
+                                           stream=True)
+    if failure and failure['status'] == 416:  # stale .part doesn't fit the file; start over once
+        os.remove(part)
+        response, failure = request_with_retry(url, number_of_tries, headers=resume_headers, on_response=stream,
+                                               stream=True)
+    if response is not None:
+        os.replace(part, fname)
+        return True
 
     print('\n  ERROR:  Download failed for')
     print(f'          url:  {url}')
@@ -54,44 +220,50 @@ def download_to_file(url, fname, f_log=None, number_of_tries=5, sleep_time=5):
         f_log.write('\nERROR:  Download failed=>')
         f_log.write(f'  _url: {url}')
         f_log.write(f'  |  _fname: {fname}')
+        f_log.write(f'  |  status: {failure["status"]}')
         f_log.write(f'  |  {dt.datetime.now().strftime("%c")}')
+    log_failure(url, fname, failure_log=failure_log, **failure)
 
     return False
 
 
-def download_to_doc(url, f_log=None, number_of_tries=5, sleep_time=5):
+def download_to_doc(url, f_log=None, number_of_tries=5, failure_log=FAILURE_LOG_FILE):
     # Download url content to string doc
-    # Loop accounts for temporary server/ISP issues
 
-    for i in range(1, number_of_tries + 1):
-        try:
-            response = requests.get(url, headers=HEADER)
-            if response.status_code == 200:
-                doc = response.content.decode('utf-8', errors='ignore')
-                return doc
-            else:
-                print(f'  Error in try #{i} download_to_file: URL = {url} | status_code = {response.status_code}')
-                if i == number_of_tries + 1:
-                    print(f'  Failed download: URL = {url}')
-                    if f_log: f_log.write(f'  Failed download: URL = {url}\n')
-        except Exception as exc:
-            if i == 1:
-                print('\n==>urlopen error in download_to_doc.py')
-            print(f'  {i}. _url:  {url}')
-            print(f'     Warning: {exc}  [{dt.datetime.now().strftime("%c")}]')
-            if '404' in str(exc):
-                break
-            print(f'     Retry in {sleep_time} seconds')
-            time.sleep(sleep_time)
-            # sleep_time += sleep_time
+    response, failure = request_with_retry(url, number_of_tries)
+    if response is not None:
+        return response.content.decode('utf-8', errors='ignore')
 
     print(f'  ERROR:  Download failed for url: {url}')
     if f_log:
-        f_log.write(f'\nERROR:  Download failed=>  _url: {url} |  {dt.datetime.now().strftime("%c")}')
+        f_log.write(f'\nERROR:  Download failed=>  _url: {url} |  status: {failure["status"]} |  ' +
+                    f'{dt.datetime.now().strftime("%c")}')
+    log_failure(url, failure_log=failure_log, **failure)
 
     return None
 
 
+def replay_failures(failure_log=FAILURE_LOG_FILE, f_log=None):
+    """
+    Retry every file download recorded in failure_log.  The log is rewritten to hold only the
+      ones that fail again (plus doc downloads, which are not replayed).  Returns (n_recovered, n_failed).
+    """
+    if not os.path.exists(failure_log):
+        return 0, 0
+    with open(failure_log, 'r') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    os.replace(failure_log, failure_log + '.replayed')
+    n_ok = 0
+    for record in records:
+        if not record['fname']:
+            # Index/doc downloads have no destination here; keep them for the program that needs them
+            log_failure(failure_log=failure_log, **{k: v for k, v in record.items() if k != 'time'})
+            continue
+        if download_to_file(record['url'], record['fname'], f_log, failure_log=failure_log):
+            n_ok += 1
+    return n_ok, len(records) - n_ok
+
+
 # Test routine
 if __name__ == '__main__':
     
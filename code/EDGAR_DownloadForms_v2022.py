@@ -17,7 +17,7 @@ import time
 # These modules must be in the same folder as this code (or use a sys.path.append())
 import EDGAR_Forms  # This module contains some predefined form groups
 import Download_Utilities as du
-import pandas as pd
+import csv
 import json
 
 
@@ -38,7 +38,8 @@ import json
 #
 #        For large downloads you will sometimes get a hiccup in the server
 #            and the file request will fail.  These errs are documented in
-#            the log file.  You can manually download those files that fail.
+#            the log file and, as JSON records, in Download_Utilities.FAILURE_LOG_FILE.
+#            Run Download_Utilities.replay_failures() to retry the files that failed.
 #            Although I attempt to work around server errors, if the SEC's server
 #            is sufficiently busy, you might have to try another day.
 #
@@ -60,10 +61,11 @@ PARM_ENDQTR = 4  # Ending quarter of each year
 # Path where you will store the downloaded files
 PARM_PATH = r'./data/'
 # Change the file pointer below to reflect your location for the log file
-#    (directory must already exist)
-PARM_LOGFILE = (r'./result' +
-                r'EDGAR_Download_FORM-X_LogFile_' +
-                str(PARM_BGNYEAR) + '-' + str(PARM_ENDYEAR) + '.txt')
+#    (directory must already exist); {0}-{1} are the bgn and end years
+PARM_LOGFILE = r'./result/EDGAR_Download_FORM-X_LogFile_{0}-{1}.txt'
+# Default CIK universe: S&P 500 constituents, mapped from tickers
+PARM_SP500_FILE = r'./sp500.csv'
+PARM_TICKER_CIK_FILE = r'./ticker_cik_mapping.json'
 # EDGAR parameter
 PARM_FORM_PREFIX = 'https://www.sec.gov/Archives/'
 PARM_MASTERIDX_PREFIX = 'https://www.sec.gov/Archives/edgar/full-index/'
@@ -80,34 +82,43 @@ HEADER = {'Host': 'www.sec.gov', 'Connection': 'close',
 # cik_df['quarter'] = cik_df['quarter'].astype(str)
 # cik_df['cik'] = cik_df['cik'].astype(int)
 
-sp500 = pd.read_csv("sp500.csv")
-with open("ticker_cik_mapping.json", 'r') as file:
-    ciks_json = json.load(file)
-ticker_cik = {}
+_sp500_cik = None
 
-for key, item in ciks_json.items():
-    ticker_cik[item["ticker"]] = item["cik_str"]
 
-sp500_cik = []
-for index, row in sp500.iterrows():
-    row['tic'] = row['tic'].replace('.', '-')
-    if row['tic'] in ticker_cik:
-        sp500_cik.append(ticker_cik[row['tic']])
+def get_sp500_ciks():
+    """S&P 500 CIKs (ints), read from PARM_SP500_FILE / PARM_TICKER_CIK_FILE on first use."""
+    global _sp500_cik
+    if _sp500_cik is None:
+        with open(PARM_TICKER_CIK_FILE, 'r') as file:
+            ticker_cik = {item["ticker"]: item["cik_str"] for item in json.load(file).values()}
+        with open(PARM_SP500_FILE, 'r', newline='') as file:
+            tickers = [row['tic'].replace('.', '-') for row in csv.DictReader(file)]
+        _sp500_cik = [ticker_cik[tic] for tic in tickers if tic in ticker_cik]
+        print(f'{len(_sp500_cik)} S&P 500 CIKs')
+    return _sp500_cik
 
-print(len(sp500_cik))
 
-def download_forms():
+def download_forms(on_file=None, bgn_year=None, end_year=None, forms=None, ciks=None):
 
     # Download each year/quarter master.idx and save record for requested forms
-    f_log = open(PARM_LOGFILE, 'a')
+    # bgn_year, end_year, forms and ciks default to PARM_BGNYEAR, PARM_ENDYEAR, PARM_FORMS and
+    #   the S&P 500 CIKs.
+    # on_file (optional) is called with the path of every filing that is on disk,
+    #   whether just downloaded or already present, so a consumer (e.g., the parser
+    #   pipeline in Generic_Parser) can start on it before the whole run finishes.
+    bgn_year = bgn_year or PARM_BGNYEAR
+    end_year = end_year or PARM_ENDYEAR
+    forms = set(forms or PARM_FORMS)
+    ciks = set(int(cik) for cik in ciks) if ciks else set(get_sp500_ciks())
+    f_log = open(PARM_LOGFILE.format(bgn_year, end_year), 'a')
     f_log.write('BEGIN LOOPS:  {0}\n'.format(time.strftime('%c')))
     n_tot = 0
     n_errs = 0
-    for year in range(PARM_BGNYEAR, PARM_ENDYEAR + 1):
+    for year in range(bgn_year, end_year + 1):
         for qtr in range(PARM_BGNQTR, PARM_ENDQTR + 1):
             # quarter_label = f"{year}Q{qtr}"
             # current_quarter_ciks = set(cik_df[cik_df['quarter'] == quarter_label]['cik'])
-            current_quarter_ciks = set(sp500_cik)
+            current_quarter_ciks = ciks
             startloop = dt.datetime.now()
             n_qtr = 0
             file_count = dict()
@@ -142,7 +153,7 @@ def download_forms():
                     # Include the next two lines if you're getting errors during business hours
                     # while du.edgar_server_not_available(True):  # kill time when server not available
                     #    pass
-                    if item.form in PARM_FORMS and item.cik in current_quarter_ciks:
+                    if item.form in forms and item.cik in current_quarter_ciks:
                         n_qtr += 1
                         # Keep track of filings and identify duplicates
                         fid = str(item.cik) + str(item.filingdate) + item.form
@@ -156,9 +167,12 @@ def download_forms():
                                  item.path.replace('/', '_'))
                         fname = fname.replace('.txt', '_' + str(file_count[fid]) + '.txt')
                         if os.path.exists(fname):
+                            if on_file: on_file(fname)
                             continue
                         return_url = du.download_to_file(url, fname, f_log=f_log)
                         if return_url:
+                            if on_file: on_file(fname)
+                        else:
                             n_errs += 1
                         n_tot += 1
                         if n_tot % 100 == 0: print(f'  Total files: {n_tot:,}', end="\r")
@@ -0,0 +1,118 @@
+"""
+Batched market-model / factor-model abnormal returns for many events at once.
+  All events' estimation windows are stacked from one daily returns panel (dates x firms) and the
+  OLS fits are solved together with NumPy, so tens of thousands of filings take one pass instead
+  of a query and a regression per row.
+
+  returns : DataFrame, index = trading dates (sorted), one column per firm, daily returns
+  factors : DataFrame on the same index, one column per regressor (e.g., ['ewretd'] for the
+            market model, or Fama-French factors); a constant is always added
+  rf      : optional Series on the same index, subtracted from returns (use with excess-return factors)
+
+  buy_and_hold_excess gives the raw buy-and-hold return minus the market's over the same windows.
+
+  Day 0 of an event is its date, or the next trading day if the date is not one.  Windows are in
+  trading days relative to day 0, both ends included.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+EST_WINDOW = (-250, -30)
+CAR_WINDOWS = [(-1, 1), (-1, 2)]
+MIN_EST_OBS = 100  # events with fewer usable estimation days get NaN
+CHUNK_SIZE = 5000  # events solved per batch; bounds the (events x days x regressors) arrays
+
+
+def event_day0(dates, event_dates):
+    """Index into dates of each event's day 0 (-1 if the event is after the last date)."""
+    day0 = np.searchsorted(dates.values, pd.to_datetime(event_dates).values, side='left')
+    return np.where(day0 < len(dates), day0, -1)
+
+
+def _window(R, X, firm, day0, window):
+    # Stack rows day0+window of every event: Y (E, L), X (E, L, K+1), usable mask (E, L)
+    offsets = np.arange(window[0], window[1] + 1)
+    idx = day0[:, None] + offsets[None, :]
+    inside = (idx >= 0) & (idx < R.shape[0]) & (day0[:, None] >= 0)
+    idx = np.clip(idx, 0, R.shape[0] - 1)
+    Y = R[idx, firm[:, None]]
+    Xw = X[idx]
+    usable = inside & ~np.isnan(Y) & ~np.isnan(Xw).any(axis=2)
+    return Y, Xw, usable
+
+
+def abnormal_returns(returns, factors, event_firms, event_dates, rf=None,
+                     est_window=EST_WINDOW, car_windows=CAR_WINDOWS, min_obs=MIN_EST_OBS):
+    """
+    Fit ret = alpha + beta'factors on each event's estimation window and cumulate the abnormal
+      returns over each car window.  Returns a DataFrame aligned with the events:
+      n_est, alpha, beta_<factor>..., and car_<start>_<end> per window (e.g., car_-1_1).
+    """
+    R = returns.to_numpy(dtype=float)
+    if rf is not None:
+        R = R - rf.to_numpy(dtype=float)[:, None]
+    X = np.column_stack([np.ones(len(factors)), factors.to_numpy(dtype=float)])  # (T, K+1)
+
+    firm_pos = pd.Index(returns.columns).get_indexer(pd.Index(event_firms))
+    day0 = event_day0(returns.index, event_dates)
+    day0 = np.where(firm_pos >= 0, day0, -1)  # firms not in the panel have no windows
+    firm = np.maximum(firm_pos, 0)
+
+    chunks = [_fit_chunk(R, X, firm[i:i + CHUNK_SIZE], day0[i:i + CHUNK_SIZE], factors.columns,
+                         est_window, car_windows, min_obs)
+              for i in range(0, len(day0), CHUNK_SIZE)]
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def buy_and_hold_excess(returns, market, event_firms, event_dates, windows=CAR_WINDOWS, min_days=2):
+    """
+    Buy-and-hold return minus the buy-and-hold market return over each window, prod(1 + ret) -
+      prod(1 + market), with missing returns as 0.  Returns a DataFrame aligned with the events with
+      bhar_<start>_<end> per window; NaN when fewer than min_days of the firm's returns are in the window.
+    """
+    R = returns.to_numpy(dtype=float)
+    M = market.to_numpy(dtype=float).ravel()
+    firm_pos = pd.Index(returns.columns).get_indexer(pd.Index(event_firms))
+    day0 = event_day0(returns.index, event_dates)
+    day0 = np.where(firm_pos >= 0, day0, -1)
+    firm = np.maximum(firm_pos, 0)
+
+    out = pd.DataFrame(index=range(len(day0)))
+    for window in windows:
+        idx = day0[:, None] + np.arange(window[0], window[1] + 1)[None, :]
+        inside = (idx >= 0) & (idx < R.shape[0]) & (day0[:, None] >= 0)
+        idx = np.clip(idx, 0, R.shape[0] - 1)
+        Y = R[idx, firm[:, None]]
+        firm_ret = np.prod(1 + np.where(inside, np.nan_to_num(Y), 0.0), axis=1)
+        market_ret = np.prod(1 + np.where(inside, np.nan_to_num(M[idx]), 0.0), axis=1)
+        bhar = firm_ret - market_ret
+        bhar[(inside & ~np.isnan(Y)).sum(axis=1) < min_days] = np.nan
+        out[f'bhar_{window[0]}_{window[1]}'] = bhar
+    return out
+
+
+def _fit_chunk(R, X, firm, day0, factor_names, est_window, car_windows, min_obs):
+    # Estimation: zero out unusable rows so they drop out of the normal equations
+    Y, Xe, usable = _window(R, X, firm, day0, est_window)
+    Y = np.where(usable, Y, 0.0)
+    Xe = np.where(usable[:, :, None], Xe, 0.0)
+    XtX = np.einsum('elk,elj->ekj', Xe, Xe)
+    Xty = np.einsum('elk,el->ek', Xe, Y)
+    coef = np.einsum('ekj,ej->ek', np.linalg.pinv(XtX), Xty)  # (E, K+1)
+    n_est = usable.sum(axis=1)
+    coef[n_est < min_obs] = np.nan
+
+    out = pd.DataFrame({'n_est': n_est, 'alpha': coef[:, 0]})
+    for k, name in enumerate(factor_names, start=1):
+        out[f'beta_{name}'] = coef[:, k]
+    for window in car_windows:
+        Y, Xw, usable = _window(R, X, firm, day0, window)
+        ar = Y - np.einsum('elk,ek->el', Xw, coef)
+        car = np.where(usable, ar, 0.0).sum(axis=1)
+        car[~usable.any(axis=1) | np.isnan(coef[:, 0])] = np.nan
+        out[f'car_{window[0]}_{window[1]}'] = car
+    return out
@@ -0,0 +1,114 @@
+"""
+Content-hash deduplication of filings.
+  The corpus holds byte-identical copies of some filings (re-filings numbered by the file_count
+  suffix in EDGAR_DownloadForms_v2022, manual copies like '..._1 copy.txt').  Each filing is hashed
+  once (SHA-256) and recorded in HASH_INDEX_FILE with its size and mtime, and re-hashed when either
+  changes (e.g., a re-downloaded or repaired file); the first filing registered with a given hash
+  is its canonical filing and later ones are aliases.  The parser scores each canonical filing once
+  and, by policy, either fans its scores out to the aliases or drops them; either way duplicates
+  no longer inflate idf document counts.
+"""
+
+import hashlib
+import json
+import multiprocessing as mp
+import os
+from tqdm import tqdm
+
+
+HASH_INDEX_FILE = r'./result/filing_hashes.json'
+CHUNK_SIZE = 1 << 20
+
+
+def file_hash(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_hashes(path=HASH_INDEX_FILE):
+    """{'files': {filename: hash}, 'stat': {filename: [size, mtime_ns]}, 'canonical': {hash: canonical filename}}"""
+    index = {'files': {}, 'stat': {}, 'canonical': {}}
+    if os.path.exists(path):
+        with open(path, 'r') as f_in:
+            index.update(json.load(f_in))  # indexes saved without 'stat' are re-hashed once
+    return index
+
+
+def save_hashes(index, path=HASH_INDEX_FILE):
+    with open(path, 'w') as f_out:
+        json.dump(index, f_out)
+
+
+def _stat(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def is_current(index, filename):
+    """True if filename's recorded hash still describes the file on disk (same size and mtime)."""
+    fname = os.path.basename(filename)
+    return fname in index['files'] and index['stat'].get(fname) == _stat(filename)
+
+
+def register(index, filename, digest=None):
+    """Record filename's hash (computed if not given or not current); return the canonical filename for it."""
+    fname = os.path.basename(filename)
+    if digest is None and not is_current(index, filename):
+        digest = file_hash(filename)
+    if digest is not None:
+        old = index['files'].get(fname)
+        if old != digest and index['canonical'].get(old) == fname:
+            del index['canonical'][old]  # the file no longer holds that content
+        index['files'][fname] = digest
+        index['stat'][fname] = _stat(filename)
+    return index['canonical'].setdefault(index['files'][fname], fname)
+
+
+def set_canonical(index, filename):
+    """Make filename the canonical filing for its hash (e.g., when the old canonical is not in this run)."""
+    fname = os.path.basename(filename)
+    index['canonical'][index['files'][fname]] = fname
+
+
+def _hash_one(filename):
+    return filename, file_hash(filename)
+
+
+def dedup(file_list, index):
+    """
+    Hash the files in file_list not yet in the index and split the list.
+      Returns (unique, aliases): the full paths of the canonical filings to parse, and
+      {canonical filename: [alias filenames]} for the rest.  Files are registered shortest name
+      first, so '_1.txt' is canonical over '_2.txt' and '_1 copy.txt'.
+    """
+    todo = [f for f in file_list if not is_current(index, f)]
+    digests = {}
+    if todo:
+        print(f"Hashing {len(todo)} of {len(file_list)} files")
+        with mp.Pool(processes=mp.cpu_count()) as pool:
+            for filename, digest in tqdm(pool.imap_unordered(_hash_one, todo), total=len(todo)):
+                digests[filename] = digest
+
+    unique = []
+    aliases = {}
+    for filename in sorted(file_list, key=lambda f: (len(os.path.basename(f)), os.path.basename(f))):
+        fname = os.path.basename(filename)
+        canonical = register(index, filename, digests.get(filename))
+        if canonical == fname:
+            unique.append(filename)
+        else:
+            aliases.setdefault(canonical, []).append(fname)
+    # A canonical filing from an earlier run that is missing from this list is parsed in its alias' place
+    present = {os.path.basename(f): f for f in file_list}
+    for canonical in [c for c in aliases if c not in present]:
+        first, *rest = aliases.pop(canonical)
+        unique.append(present[first])
+        set_canonical(index, first)
+        if rest:
+            aliases[first] = rest
+    print(f"{len(unique)} unique filings, {sum(len(a) for a in aliases.values())} duplicates")
+    return unique, aliases
+
@@ -41,11 +41,16 @@ import sys
 import time
 #sys.path.append('D:\GD\Python\TextualAnalysis\Modules')  # Modify to identify path for custom modules
 import Load_MasterDictionary as LM
+from Phrase_Matcher import PhraseMatcher
+import Section_Index as SI
+import Filing_Dedup as FD
 import numpy as np
 from tqdm import tqdm
 import math
 import multiprocessing as mp
-import pandas as pd
+import json
+import queue
+import threading
 
 """
     Specify File Locations for Generic Parser.py
@@ -62,6 +67,30 @@ HARVARD_NEG_FILE = r'./Harvard IV_Negative Word List_Inf.txt'
 EXP_SETTING = "Harvard"
 assert EXP_SETTING in ["LM", "Harvard"]
 
+# Pipeline mode: parse each filing as soon as EDGAR_DownloadForms_v2022 lands it on disk
+#   instead of globbing TARGET_FILES after the download has finished.
+PIPELINE_MODE = False
+PIPELINE_QUEUE_SIZE = 64  # max filings waiting between the downloader and the parser pool
+# Restrict the parse to these sections (names in Section_Index.SECTION_ITEMS, e.g., ['mdna'] or
+#   ['risk_factors']); None parses the whole filing.  Run Section_Index.py once to build the offsets.
+SECTIONS = None
+# Byte-identical filings (see Filing_Dedup) are parsed once and counted once for idf.
+#   'fanout' gives every duplicate the scores of its canonical filing, 'exclude' drops the
+#   duplicates from the output, None parses every file as a separate document.
+DEDUP_POLICY = 'fanout'
+assert DEDUP_POLICY in ['fanout', 'exclude', None]
+# False: a word inside a matched phrase counts only toward the phrase (leftmost-longest match);
+#   True: it also counts toward its own entry
+PHRASE_OVERLAPS = False
+# Custom word list (one entry per line; a line of several words is a phrase, e.g. 'GOING CONCERN')
+#   used instead of EXP_SETTING's negative words; None uses the built-in list.  Results go to
+#   EXP_SETTING's directory with the file's name in their suffix, e.g. raw_counts_phrases.jsonl.
+LEXICON_FILE = None
+
+# Settings that configure() may override (e.g., from Pipeline_CLI.py)
+_SETTINGS = ['TARGET_FILES', 'EXP_SETTING', 'PIPELINE_MODE', 'SECTIONS', 'DEDUP_POLICY', 'PHRASE_OVERLAPS',
+             'LEXICON_FILE']
+
 # # User defined output file
 # OUTPUT_FILE = r'./result2014-2016.csv'
 
@@ -72,37 +101,105 @@ assert EXP_SETTING in ["LM", "Harvard"]
 #                  '# of numbers', 'avg # of syllables per word', 'average word length', 'vocabulary',
 #                  'CIK', ]
 
-lm_dictionary = LM.load_masterdictionary(MASTER_DICTIONARY_FILE, True)
-with open(HARVARD_NEG_FILE, 'r') as f:
-    harvard_neg_words = {line.strip().upper() for line in f if line.strip()}
+_lm_dictionary = None
+_lexicons = {}
+
+
+def configure(**settings):
+    """Override the settings above, e.g., configure(EXP_SETTING='LM', SECTIONS=['mdna'])."""
+    for name, value in settings.items():
+        assert name in _SETTINGS, f'Unknown setting {name}'
+        globals()[name] = value
+    assert EXP_SETTING in ["LM", "Harvard"]
+    assert DEDUP_POLICY in ['fanout', 'exclude', None]
+
+
+def current_settings():
+    return {name: globals()[name] for name in _SETTINGS}
+
+
+def _init_worker(settings):
+    # Pool initializer: workers started with 'spawn' re-import this module with the defaults
+    configure(**settings)
+
+
+def run_suffix():
+    # Custom-lexicon and section runs keep their own raw counts and scores, e.g.
+    #   raw_counts_mdna.jsonl, result_phrases_mdna
+    parts = []
+    if LEXICON_FILE:
+        parts.append(os.path.splitext(os.path.basename(LEXICON_FILE))[0].replace(' ', '_'))
+    if SECTIONS:
+        parts.append('-'.join(SECTIONS))
+    return ''.join(f'_{part}' for part in parts)
+
+
+def raw_counts_file():
+    # Raw per-document counts are appended here as each filing is parsed (one JSON record per line)
+    return f'./result/{EXP_SETTING}/raw_counts{run_suffix()}.jsonl'
+
+
+def aliases_file(raw_counts_path=None):
+    # The run's duplicate map and DEDUP_POLICY, next to its raw counts (raw_counts_mdna.jsonl -> aliases_mdna.json)
+    path = raw_counts_path or raw_counts_file()
+    name = os.path.basename(path).replace('raw_counts', 'aliases', 1).replace('.jsonl', '.json')
+    return os.path.join(os.path.dirname(path), name)
+
+
+def result_store():
+    # Scores are written here; full-filing runs use ./result/{EXP_SETTING}/result
+    return f'./result/{EXP_SETTING}/result{run_suffix()}'
+
 
-if EXP_SETTING == "LM":
-    neg_words = [word for word in lm_dictionary if lm_dictionary[word].negative]
-else:
-    neg_words = harvard_neg_words
-neg_words_idx = {}
-cnt = 0
-for word in neg_words:
-    neg_words_idx[word] = cnt
-    cnt += 1
+def get_lm_dictionary():
+    """LM master dictionary, loaded on first use."""
+    global _lm_dictionary
+    if _lm_dictionary is None:
+        _lm_dictionary = LM.load_masterdictionary(MASTER_DICTIONARY_FILE, True)
+    return _lm_dictionary
 
-tf_matrix = [] # (# of documents, # of negative words in lm_dictionary)
-idf_matrix = [] # (# of documents, # of negative words in lm_dictionary)
-doc_length_matrix = [] # (# of documents, 1)
+
+def read_word_list(path):
+    # One entry per line; multi-word lines are phrases.  Sorted so indices are the same in every process
+    with open(path, 'r') as f:
+        return sorted({' '.join(line.split()).upper() for line in f if line.strip()})
+
+
+def get_lexicon():
+    """(lm_dictionary, neg_words_idx, neg_words_matcher) for EXP_SETTING / LEXICON_FILE, built on first use."""
+    key = (EXP_SETTING, LEXICON_FILE)
+    if key not in _lexicons:
+        lm_dictionary = get_lm_dictionary()
+        if LEXICON_FILE:
+            neg_words = read_word_list(LEXICON_FILE)
+        elif EXP_SETTING == "LM":
+            neg_words = [word for word in lm_dictionary if lm_dictionary[word].negative]
+        else:
+            neg_words = read_word_list(HARVARD_NEG_FILE)
+        neg_words_idx = {word: idx for idx, word in enumerate(neg_words)}
+        # Single words and phrases are matched together in one pass; entry i of the matcher is neg_words_idx i
+        neg_words_matcher = PhraseMatcher(neg_words_idx)
+        _lexicons[key] = (lm_dictionary, neg_words_idx, neg_words_matcher)
+    return _lexicons[key]
 
 
 def processing_doc(doc):
-    doc_length = 0
-    tf_line = [0] * len(neg_words)
-    idf_line = [0] * len(neg_words)
+    lm_dictionary, neg_words_idx, neg_words_matcher = get_lexicon()
+    tf_line = [0] * len(neg_words_idx)
+    idf_line = [0] * len(neg_words_idx)
     tokens = re.findall('\w+', doc)  # Note that \w+ splits hyphenated words
-    for token in tokens:
-        if not token.isdigit() and len(token) > 1 and token in lm_dictionary:
-            doc_length += 1
-            if token in neg_words_idx:
-                tf_line[neg_words_idx[token]] += 1
-                idf_line[neg_words_idx[token]] = 1
-    return tf_line, idf_line, doc_length
+    counted = [not token.isdigit() and len(token) > 1 and token in lm_dictionary for token in tokens]
+    doc_length = sum(counted)
+    n_unique = len({token for token, is_counted in zip(tokens, counted) if is_counted})  # distinct counted words
+    # Phrases match the literal token stream; single words must also be counted words, as before
+    matches = [(end, idx) for end, idx in neg_words_matcher.iter_matches(tokens)
+               if counted[end] or neg_words_matcher.lengths[idx] > 1]
+    if not PHRASE_OVERLAPS:
+        matches = neg_words_matcher.select_longest(matches)
+    for _, idx in matches:
+        tf_line[idx] += 1
+        idf_line[idx] = 1
+    return tf_line, idf_line, doc_length, n_unique
 
 def extract_cik_from_filename(filename):
     parts = filename.split('_')
@@ -119,12 +216,18 @@ def extract_date_from_filename(filename):
 def process_single_file(filename):
     """Process a single file and return results for parallel execution."""
     try:
-        with open(filename, 'r', encoding='UTF-8', errors='ignore') as f_in:
-            doc = f_in.read()
+        if SECTIONS:
+            doc = SI.read_sections(filename, SECTIONS)
+            if doc is None:
+                print(f"No {SECTIONS} section found in {filename}")
+                return None
+        else:
+            with open(filename, 'r', encoding='UTF-8', errors='ignore') as f_in:
+                doc = f_in.read()
         doc = re.sub('(May|MAY)', ' ', doc)  # drop all May month references
         doc = doc.upper()  # for this parse caps aren't informative so shift
 
-        tf_line, idf_line, doc_length = processing_doc(doc)
+        tf_line, idf_line, doc_length, n_unique = processing_doc(doc)
         fname = os.path.basename(filename)
         cik = extract_cik_from_filename(fname)
         file_date = extract_date_from_filename(fname)
@@ -132,6 +235,7 @@ def process_single_file(filename):
             'tf_line': tf_line,
             'idf_line': idf_line,
             'doc_length': doc_length,
+            'n_unique': n_unique,
             'filename': fname,
             'cik': cik,
             'file_date': file_date
@@ -141,26 +245,15 @@ def process_single_file(filename):
         return None
 
 
-def process():
-
-    file_list = glob.glob(TARGET_FILES)
-    print(f"Total files to process: {len(file_list)}")
-    print(f"First few files: {file_list[:3]}")
-    # file_list = file_list[:16]
-
-    # Determine the number of processes (use CPU count or a fixed number)
-    num_processes = mp.cpu_count()
-    print(f"Using {num_processes} processes")
-
-    # Create a process pool
-    with mp.Pool(processes=num_processes) as pool:
-        # Map the file processing to the pool
-        results = []
-        for result in tqdm(pool.imap_unordered(process_single_file, file_list), total=len(file_list)):
-            if result is not None:
-                results.append(result)
-
+def compute_scores(results, num_docs, aliases=None):
+    """
+    Corpus-wide tf-idf and term weights from per-document results (the only step needing all docs).
+      aliases ({filename: [duplicate filenames]}) adds a row with the same scores for each duplicate.
+    """
     # Collect results into matrices
+    tf_matrix = []
+    idf_matrix = []
+    doc_length_matrix = []
     filename_list = []
     cik_list = []
     file_date_list = []
@@ -172,8 +265,9 @@ def process():
         cik_list.append(result['cik'])
         file_date_list.append(result['file_date'])
 
-    tf_matrix_np = np.array(tf_matrix, dtype=float)
-    idf_matrix_np = np.array(idf_matrix)
+    n_words = len(get_lexicon()[1])
+    tf_matrix_np = np.array(tf_matrix, dtype=float).reshape(-1, n_words)
+    idf_matrix_np = np.array(idf_matrix).reshape(-1, n_words)
     doc_length_matrix_np = np.array(doc_length_matrix, dtype=float).reshape(-1, 1)
     
     # tf
@@ -182,7 +276,6 @@ def process():
         if doc_length_matrix_np[i, 0] > 0:
             tf_matrix_normalized[i, :] = tf_matrix_np[i, :] / doc_length_matrix_np[i, 0]
     # idf
-    num_docs = len(file_list)
     word_doc_counts = np.sum(idf_matrix_np, axis=0) 
     idf_vector = np.array([math.log(num_docs / (count + 1)) for count in word_doc_counts])
     # tf-idf
@@ -194,9 +287,192 @@ def process():
     for i in range(len(doc_length_matrix)):
         if doc_length_matrix_np[i, 0] > 0:
             term_weights[i, 0] = neg_word_counts[i, 0] / doc_length_matrix_np[i, 0]
+    if aliases:
+        rows = [i for i, fname in enumerate(filename_list) for _ in aliases.get(fname, [])]
+        alias_names = [alias for fname in filename_list for alias in aliases.get(fname, [])]
+        tfidf_score = np.vstack([tfidf_score, tfidf_score[rows]])
+        term_weights = np.vstack([term_weights, term_weights[rows]])
+        filename_list = filename_list + alias_names
+        cik_list = cik_list + [extract_cik_from_filename(fname) for fname in alias_names]
+        file_date_list = file_date_list + [extract_date_from_filename(fname) for fname in alias_names]
     return tfidf_score, term_weights, filename_list, cik_list, file_date_list
 
 
+def process():
+
+    file_list = glob.glob(TARGET_FILES)
+    print(f"Total files to process: {len(file_list)}")
+    print(f"First few files: {file_list[:3]}")
+    # file_list = file_list[:16]
+
+    aliases = {}
+    if DEDUP_POLICY:
+        hashes = FD.load_hashes()
+        file_list, aliases = FD.dedup(file_list, hashes)
+        FD.save_hashes(hashes)
+
+    if SECTIONS:
+        SI.build_index(file_list)  # only scans files not indexed yet
+
+    # Determine the number of processes (use CPU count or a fixed number)
+    num_processes = mp.cpu_count()
+    print(f"Using {num_processes} processes")
+
+    # Create a process pool
+    get_lexicon()  # load once here; forked workers inherit it
+    with mp.Pool(processes=num_processes, initializer=_init_worker, initargs=(current_settings(),)) as pool:
+        # Map the file processing to the pool
+        results = []
+        for result in tqdm(pool.imap_unordered(process_single_file, file_list), total=len(file_list)):
+            if result is not None:
+                results.append(result)
+
+    # Persist raw counts (and this run's duplicates) so Score_Engine can re-weight without re-parsing
+    with open(raw_counts_file(), 'w') as f_out:
+        for result in results:
+            save_raw_counts(result, f_out)
+    save_aliases(aliases)
+
+    # N counts the parsed documents, as in process_pipeline and Score_Engine
+    return compute_scores(results, len(results), aliases if DEDUP_POLICY == 'fanout' else None)
+
+
+def save_raw_counts(result, f_out):
+    """Append one parsed document to the raw-count store, keeping only non-zero counts."""
+    record = {key: result[key] for key in ('filename', 'cik', 'file_date', 'doc_length', 'n_unique')}
+    record['counts'] = {word: result['tf_line'][idx] for word, idx in get_lexicon()[1].items()
+                        if result['tf_line'][idx]}
+    f_out.write(json.dumps(record) + '\n')
+
+
+def save_aliases(aliases, path=None):
+    """Record the run's {canonical filename: [duplicate filenames]} and DEDUP_POLICY for Score_Engine."""
+    with open(path or aliases_file(), 'w') as f_out:
+        json.dump({'policy': DEDUP_POLICY, 'aliases': aliases}, f_out)
+
+
+def load_aliases(path=None):
+    """(policy, aliases) saved with a run's raw counts; (None, {}) for runs that predate the file."""
+    path = path or aliases_file()
+    if not os.path.exists(path):
+        return None, {}
+    with open(path, 'r') as f_in:
+        record = json.load(f_in)
+    return record['policy'], record['aliases']
+
+
+def load_raw_counts(path=None):
+    """Read the raw-count store back into the per-document result format used by compute_scores."""
+    neg_words_idx = get_lexicon()[1]
+    results = []
+    with open(path or raw_counts_file(), 'r') as f_in:
+        for line in f_in:
+            record = json.loads(line)
+            tf_line = [0] * len(neg_words_idx)
+            for word, count in record.pop('counts').items():
+                if word in neg_words_idx:
+                    tf_line[neg_words_idx[word]] = count
+            record['tf_line'] = tf_line
+            record['idf_line'] = [1 if count else 0 for count in tf_line]
+            results.append(record)
+    return results
+
+
+def process_pipeline(**download_args):
+    """
+    Overlap downloading and parsing.
+      A downloader thread runs EDGAR_DownloadForms_v2022.download_forms and puts every filing that
+      reaches disk on a bounded queue; the main thread hands them to the parser pool, and each
+      result's raw counts are appended to raw_counts_file() as soon as it comes back.  Only the
+      corpus-wide idf step waits for the last download.  Filings already in raw_counts_file()
+      (from an interrupted run) are not parsed again, nor are duplicates of a parsed filing
+      (see DEDUP_POLICY).  download_args (bgn_year, end_year, forms, ciks) go to download_forms.
+    """
+    import EDGAR_DownloadForms_v2022 as EDGAR  # loads the S&P 500 CIK list, so only import when needed
+
+    hashes = FD.load_hashes() if DEDUP_POLICY else None
+    aliases = {}
+    done = set()
+    if os.path.exists(raw_counts_file()):
+        done = {result['filename'] for result in load_raw_counts()}
+        aliases = load_aliases()[1]
+        print(f"Resuming: {len(done)} filings already in {raw_counts_file()}")
+
+    file_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    _end = object()  # sentinel: downloader finished
+    download_error = []
+
+    def producer():
+        try:
+            EDGAR.download_forms(on_file=file_queue.put, **download_args)
+        except BaseException as exc:  # re-raised in the main thread once the pool has drained
+            download_error.append(exc)
+        finally:
+            file_queue.put(_end)
+
+    num_processes = mp.cpu_count()
+    print(f"Using {num_processes} processes")
+    # Bound the number of filings handed to the pool but not yet persisted, so a fast
+    #   download (e.g., files already on disk) doesn't pile up in the pool's task queue
+    in_flight = threading.BoundedSemaphore(2 * num_processes)
+    lock = threading.Lock()
+    progress = tqdm(desc='Parsed')
+
+    get_lexicon()  # load once here; forked workers inherit it
+    with open(raw_counts_file(), 'a') as f_out, \
+            mp.Pool(processes=num_processes, initializer=_init_worker, initargs=(current_settings(),)) as pool:
+        # Start the downloader only after the pool has forked its workers: forking while another
+        #   thread holds a lock (stdout, tqdm, queue, SSL) can deadlock the children
+        downloader = threading.Thread(target=producer, daemon=True)
+        downloader.start()
+
+        def on_result(result):
+            # Runs in the pool's result thread
+            if result is not None:
+                with lock:
+                    save_raw_counts(result, f_out)
+                    f_out.flush()
+            progress.update(1)
+            in_flight.release()
+
+        def on_error(exc):
+            print(f"Error in parser worker: {exc}")
+            in_flight.release()
+
+        while True:
+            fname = file_queue.get()
+            if fname is _end:
+                break
+            if hashes is not None:
+                canonical = FD.register(hashes, fname)  # first filing seen with this content
+                if canonical != os.path.basename(fname):
+                    if canonical in done:
+                        if os.path.basename(fname) not in aliases.setdefault(canonical, []):
+                            aliases[canonical].append(os.path.basename(fname))
+                        continue
+                    # canonical from an earlier run that isn't parsed in this one: this file takes its
+                    #   place, so later copies become its aliases instead of being parsed again
+                    FD.set_canonical(hashes, fname)
+            if os.path.basename(fname) in done:
+                continue
+            done.add(os.path.basename(fname))
+            in_flight.acquire()
+            pool.apply_async(process_single_file, (fname,), callback=on_result, error_callback=on_error)
+        pool.close()
+        pool.join()
+    progress.close()
+    downloader.join()
+    if hashes is not None:
+        FD.save_hashes(hashes)
+    save_aliases(aliases)
+    if download_error:
+        # Parsed filings are already in raw_counts_file(); rerun to resume instead of scoring a partial corpus
+        raise download_error[0]
+
+    results = load_raw_counts()
+    return compute_scores(results, len(results), aliases if DEDUP_POLICY == 'fanout' else None)
+
+
 # def get_data(doc):
 
 #     vdictionary = {}
@@ -238,8 +514,14 @@ def process():
 
 #     return _odata
 
-def main():
-    tfidf_score, term_weights, filename_list, cik_list, file_date_list = process()
+def main(**download_args):
+    import pandas as pd  # only needed for the output, not by the parser workers
+    import Result_Store as RS
+
+    if PIPELINE_MODE:
+        tfidf_score, term_weights, filename_list, cik_list, file_date_list = process_pipeline(**download_args)
+    else:
+        tfidf_score, term_weights, filename_list, cik_list, file_date_list = process()
     print(np.shape(tfidf_score))
     print(np.shape(term_weights))
     df = pd.DataFrame({
@@ -249,7 +531,8 @@ def main():
         'cik': cik_list,
         'file_date': file_date_list
     })
-    df.to_csv(f"./result/{EXP_SETTING}/result.csv")
+    # Scores are recomputed corpus-wide (idf), so they replace the whole store, not just their years
+    RS.write_results(df, result_store(), mode='replace')
         
 
 if __name__ == '__main__':
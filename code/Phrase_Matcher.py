@@ -0,0 +1,70 @@
+"""
+Aho-Corasick automaton over a token stream.
+  Lexicon entries are single words or multi-word phrases ('MATERIAL WEAKNESS').  The automaton is
+  built once over the entries' tokens, and a document is matched in one linear pass over its
+  tokens, independent of the number of entries.  iter_matches() reports every occurrence, including
+  overlapping ones (a word inside a phrase that is also an entry); select_longest() keeps the
+  leftmost-longest non-overlapping ones so each token counts toward at most one entry.
+"""
+
+from collections import deque
+
+
+class PhraseMatcher:
+    def __init__(self, entries):
+        """entries: iterable of strings; whitespace separates the tokens of a phrase."""
+        self.entries = []
+        self.lengths = []   # entry index -> number of tokens
+        self.goto = [{}]    # state -> {token: next state}
+        self.fail = [0]     # state -> longest proper suffix state
+        self.output = [[]]  # state -> indices of entries ending here
+        for entry in entries:
+            self._add(entry)
+        self._build_fail_links()
+
+    def _add(self, entry):
+        state = 0
+        for token in entry.split():
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][token] = len(self.goto) - 1
+            state = self.goto[state][token]
+        self.output[state].append(len(self.entries))
+        self.entries.append(' '.join(entry.split()))
+        self.lengths.append(len(entry.split()))
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f and token not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(token, 0) if self.goto[f].get(token) != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, tokens):
+        """Yield (position of the last token, entry index) for every match in the token sequence."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for end, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for idx in output[state]:
+                yield end, idx
+
+    def select_longest(self, matches):
+        """Leftmost-longest non-overlapping subset of (end, entry index) matches."""
+        spans = sorted(((end - self.lengths[idx] + 1, -self.lengths[idx], end, idx) for end, idx in matches))
+        selected = []
+        next_free = 0
+        for start, _, end, idx in spans:
+            if start >= next_free:
+                selected.append((end, idx))
+                next_free = end + 1
+        return selected
@@ -0,0 +1,178 @@
+"""
+Single entry point for the pipeline; run from the repository root, e.g.
+  python code/Pipeline_CLI.py download --bgn-year 2020 --end-year 2024 --form 10-K --form 10-Q
+  python code/Pipeline_CLI.py parse --lexicon LM --sections mdna
+  python code/Pipeline_CLI.py parse --lexicon LM --lexicon-file ./phrases.txt
+  python code/Pipeline_CLI.py parse --lexicon Harvard --pipeline --bgn-year 2024 --end-year 2024
+  python code/Pipeline_CLI.py rescore --lexicon LM --scheme bm25 --scheme lm
+  python code/Pipeline_CLI.py returns --lexicon LM
+  python code/Pipeline_CLI.py plot
+
+Options default to the constants in each module; unknown sections or schemes and options that
+  don't apply to the chosen mode (e.g., --bgn-year without --pipeline) are rejected up front.  Modules are imported inside each subcommand,
+  so a subcommand only loads the data (dictionaries, CIK lists, WRDS) it actually uses.
+"""
+
+import argparse
+import sys
+import time
+
+
+LEXICONS = ['LM', 'Harvard']
+
+
+def add_download_args(parser):
+    parser.add_argument('--bgn-year', type=int, help='first year (default EDGAR_DownloadForms_v2022.PARM_BGNYEAR)')
+    parser.add_argument('--end-year', type=int, help='last year (default EDGAR_DownloadForms_v2022.PARM_ENDYEAR)')
+    parser.add_argument('--form', action='append', dest='forms', help='form type, repeatable (default 10-K, 10-Q)')
+    parser.add_argument('--cik', action='append', dest='ciks', type=int,
+                        help='CIK to download, repeatable (default S&P 500 constituents)')
+
+
+def download_args(args):
+    return {'bgn_year': args.bgn_year, 'end_year': args.end_year, 'forms': args.forms, 'ciks': args.ciks}
+
+
+def cmd_download(args):
+    import EDGAR_DownloadForms_v2022 as EDGAR
+    EDGAR.download_forms(**download_args(args))
+
+
+def cmd_replay(args):
+    import Download_Utilities as du
+    n_ok, n_failed = du.replay_failures()
+    print(f'{n_ok:,} recovered, {n_failed:,} still failing')
+
+
+def cmd_index_sections(args):
+    import glob
+    import Section_Index as SI
+    SI.build_index(glob.glob(args.target or SI.TARGET_FILES))
+
+
+def check_sections(args):
+    if not args.sections:
+        return
+    import Section_Index as SI
+    known = sorted({name for items in SI.SECTION_ITEMS.values() for name in items})
+    unknown = [name for name in args.sections if name not in known]
+    if unknown:
+        args.error(f'unknown section(s) {", ".join(unknown)}; choose from {", ".join(known)}')
+
+
+def check_parse(args):
+    check_sections(args)
+    if args.pipeline and args.target:
+        args.error('--target applies to batch parsing; --pipeline parses the filings it downloads')
+    if not args.pipeline and any(download_args(args).values()):
+        args.error('--bgn-year/--end-year/--form/--cik select what --pipeline downloads; ' +
+                   'use --target to select files for a batch parse')
+
+
+def check_rescore(args):
+    import Score_Engine as SE
+    check_sections(args)
+    unknown = [scheme for scheme in args.schemes or [] if scheme not in SE.SCORERS]
+    if unknown:
+        args.error(f'unknown scheme(s) {", ".join(unknown)}; choose from {", ".join(SE.SCORERS)}')
+
+
+def cmd_parse(args):
+    import Generic_Parser as GP
+    settings = {'EXP_SETTING': args.lexicon, 'PIPELINE_MODE': args.pipeline, 'SECTIONS': args.sections,
+                'DEDUP_POLICY': None if args.dedup == 'none' else args.dedup,
+                'PHRASE_OVERLAPS': args.phrase_overlaps, 'LEXICON_FILE': args.lexicon_file}
+    if args.target:
+        settings['TARGET_FILES'] = args.target
+    GP.configure(**settings)
+    GP.main(**download_args(args))
+
+
+def cmd_rescore(args):
+    import Generic_Parser as GP
+    import Score_Engine as SE
+    import Result_Store as RS
+    # same paths as the parse run that wrote the raw counts, e.g. raw_counts_mdna.jsonl -> scores_mdna
+    GP.configure(EXP_SETTING=args.lexicon, SECTIONS=args.sections, LEXICON_FILE=args.lexicon_file)
+    schemes = args.schemes or SE.SCHEMES
+    df_scores = SE.rescore(schemes, args.raw_counts or GP.raw_counts_file())
+    RS.write_results(df_scores, f'./result/{args.lexicon}/scores{GP.run_suffix()}', mode='replace')
+
+
+def cmd_returns(args):
+    import get_excess_return as GER
+    GER.main(args.lexicons or GER.SETTINGS)
+
+
+def cmd_plot(args):
+    import plot
+    plot.main()
+
+
+def cmd_convert_results(args):
+    import Result_Store as RS
+    RS.convert_csvs(LEXICONS)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='EDGAR download, lexicon scoring and return analysis.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('download', help='download filings from EDGAR')
+    add_download_args(p)
+    p.set_defaults(func=cmd_download)
+
+    p = sub.add_parser('replay-failures', help='retry downloads recorded in the failure log')
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser('index-sections', help='build the Item-section offset index')
+    p.add_argument('--target', help='glob of filings (default ./data/*/*/*.txt)')
+    p.set_defaults(func=cmd_index_sections)
+
+    p = sub.add_parser('parse', help='score filings against a lexicon')
+    p.add_argument('--lexicon', choices=LEXICONS, default='Harvard')
+    p.add_argument('--target', help='glob of filings (default ./data/*/*/*.txt)')
+    p.add_argument('--sections', nargs='+', help='only these sections, e.g. mdna risk_factors')
+    p.add_argument('--dedup', choices=['fanout', 'exclude', 'none'], default='fanout')
+    p.add_argument('--pipeline', action='store_true', help='download and parse concurrently')
+    p.add_argument('--lexicon-file',
+                   help='word/phrase list, one entry per line, instead of the lexicon\'s negative words')
+    p.add_argument('--phrase-overlaps', action='store_true',
+                   help='also count words inside a matched phrase toward their own entries')
+    add_download_args(p)
+    p.set_defaults(func=cmd_parse, check=check_parse, error=p.error)
+
+    p = sub.add_parser('rescore', help='re-weight persisted raw counts')
+    p.add_argument('--lexicon', choices=LEXICONS, default='Harvard')
+    p.add_argument('--scheme', action='append', dest='schemes',
+                   help='weighting scheme in Score_Engine.SCORERS, repeatable (default all in Score_Engine.SCHEMES)')
+    p.add_argument('--sections', nargs='+', help='rescore a section run, e.g. mdna risk_factors')
+    p.add_argument('--lexicon-file', help='rescore a run parsed with --lexicon-file')
+    p.add_argument('--raw-counts', help='raw-count file (default ./result/<lexicon>/raw_counts[_<sections>].jsonl)')
+    p.set_defaults(func=cmd_rescore, check=check_rescore, error=p.error)
+
+    p = sub.add_parser('returns', help='add excess and abnormal returns from WRDS')
+    p.add_argument('--lexicon', action='append', dest='lexicons', choices=LEXICONS)
+    p.set_defaults(func=cmd_returns)
+
+    p = sub.add_parser('plot', help='plot median returns by score quintile')
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser('convert-results', help='convert result CSVs into Parquet stores')
+    p.set_defaults(func=cmd_convert_results)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if hasattr(args, 'check'):  # option checks that need a module, before any data is loaded
+        args.check(args)
+    start = time.time()
+    print('\n' + time.strftime('%c') + f'\nPipeline_CLI.py {args.command}\n')
+    args.func(args)
+    print(f'\nRuntime: {time.time() - start:.1f}s')
+    print('\n' + time.strftime('%c') + '\nNormal termination.')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+"""
+Typed columnar store for parser / return results (Parquet, partitioned by filing year).
+  Replaces the result.csv -> result_with_excess.csv round-trips, which lost the CIK zero padding,
+  re-parsed dates and picked up an 'Unnamed: 0' index column on every read.
+
+  Schema:  filename string | cik string (10 digits, zero-padded) | file_date date32
+           | every other numeric column float32 | year int16 (hive partition key, year=YYYY/)
+
+  write_results(df, path, mode)
+      mode='append'         add the rows as new files (e.g., a new quarter); nothing is rewritten
+      mode='replace'        replace the whole store.  Use it for scores computed corpus-wide (idf
+                            depends on every document parsed), so no year keeps scores from an
+                            earlier corpus.
+      mode='replace_years'  replace the partitions of the years present in df; only when every
+                            column is computed row by row (e.g., a store of returns alone) -- a
+                            store holding corpus-wide scores is always written with 'replace'
+  read_results(path, columns=None, years=None)
+
+Run this file to convert the existing result CSVs into stores.
+"""
+
+import os
+import shutil
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+SETTINGS = ['Harvard', 'LM']
+STRING_COLUMNS = ['filename', 'cik']
+PARTITIONING = ds.partitioning(pa.schema([('year', pa.int16())]), flavor='hive')
+
+
+def normalize_cik(cik):
+    # 4127, 4127.0, '4127' and '0000004127' all become '0000004127'
+    ciks = cik.astype('string').str.replace(r'\.0$', '', regex=True).str.zfill(10)
+    return ciks.astype(object).where(cik.notna(), None)
+
+
+def normalize(df):
+    """Apply the store schema to a result DataFrame; returns (DataFrame, pyarrow schema)."""
+    # drop the stray CSV index and the partition key, which is re-derived from file_date
+    df = df.loc[:, [c for c in df.columns if not str(c).startswith('Unnamed') and c != 'year']].reset_index(drop=True)
+    fields = []
+    for column in df.columns:
+        if column == 'cik':
+            df[column] = normalize_cik(df[column])
+            fields.append(pa.field(column, pa.string()))
+        elif column == 'file_date':
+            dates = pd.to_datetime(df[column], errors='coerce')
+            if dates.isna().any():
+                # year (the partition key) comes from file_date, so rows without one can't be stored
+                bad = df.loc[dates.isna(), 'filename' if 'filename' in df.columns else column]
+                print(f'  WARNING: dropping {len(bad):,} rows with a missing or unparseable file_date, ' +
+                      f'e.g. {", ".join(map(str, bad.head(3)))}')
+                keep = dates.notna()
+                df, dates = df.loc[keep].reset_index(drop=True), dates[keep].reset_index(drop=True)
+            df[column] = dates.dt.date
+            fields.append(pa.field(column, pa.date32()))
+        elif column in STRING_COLUMNS or not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].map(lambda v: None if pd.isna(v) else str(v))
+            fields.append(pa.field(column, pa.string()))
+        else:
+            df[column] = df[column].astype(np.float32)
+            fields.append(pa.field(column, pa.float32()))
+    df['year'] = pd.to_datetime(df['file_date']).dt.year.astype(np.int16)
+    fields.append(pa.field('year', pa.int16()))
+    return df, pa.schema(fields)
+
+
+def write_results(df, path, mode='append'):
+    assert mode in ['append', 'replace', 'replace_years']
+    df, schema = normalize(df)
+    if mode == 'replace' and os.path.isdir(path):
+        shutil.rmtree(path)
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    ds.write_dataset(table, path, format='parquet', partitioning=PARTITIONING,
+                     basename_template=f'part-{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}-{{i}}.parquet',
+                     existing_data_behavior='overwrite_or_ignore' if mode == 'append' else 'delete_matching')
+    print(f'{len(df):,} rows written to {path} ({mode})')
+
+
+def read_results(path, columns=None, years=None):
+    """Load a store into a DataFrame (file_date as datetime64, cik as zero-padded str)."""
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+    # files appended at different times may carry different columns
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in dataset.get_fragments()] +
+                              [PARTITIONING.schema])
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING, schema=schema)
+    flt = ds.field('year').isin(list(years)) if years is not None else None
+    return dataset.to_table(columns=columns, filter=flt).to_pandas(date_as_object=False)
+
+
+def convert_csvs(settings=SETTINGS):
+    """Convert result/{setting}/result.csv and result_with_excess.csv into stores next to them."""
+    for SETTING in settings:
+        for name in ['result', 'result_with_excess']:
+            csv_file = f'./result/{SETTING}/{name}.csv'
+            if os.path.exists(csv_file):
+                write_results(pd.read_csv(csv_file), f'./result/{SETTING}/{name}', mode='replace')
+
+
+if __name__ == '__main__':
+    print('\n' + time.strftime('%c') + f'\n{sys.argv[0]}\n')
+    convert_csvs()
+    print('\n' + time.strftime('%c') + '\nNormal termination.')
@@ -0,0 +1,162 @@
+"""
+Re-score the corpus from the raw counts persisted by Generic_Parser, without re-parsing any filing.
+  Generic_Parser writes one record per document (filename, cik, file_date, doc_length, n_unique
+  and the non-zero lexicon word counts) to result/{EXP_SETTING}/raw_counts.jsonl.  This program loads them
+  into a sparse document x term matrix and computes every weighting scheme in SCHEMES as batched
+  sparse-matrix operations, writing one column per scheme.
+
+Schemes (each summed over the lexicon words in a document):
+   tfidf    (tf / doc_length) * log(N / (df + 1))   - what Generic_Parser reports
+   lm       (1 + log tf) / (1 + log a) * log(N / df) - Loughran-McDonald (JF 2011), a = average
+                                                       word count in the document (doc_length / n_unique)
+   bm25     Okapi BM25 with BM25_K1, BM25_B
+   binary   number of distinct lexicon words in the document
+   log_tf   (1 + log tf)
+   term_weights   total lexicon count / doc_length   - proportion of negative words
+
+  N and df count the parsed (unique) documents in the raw-count store, as Generic_Parser does.
+  If the run that wrote the raw counts used DEDUP_POLICY = 'fanout', each of its duplicate filings
+  (saved next to the raw counts, see Generic_Parser.aliases_file) gets a row with the scores of its
+  canonical filing, as in Generic_Parser's result store.
+"""
+
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import Result_Store as RS
+from Generic_Parser import extract_cik_from_filename, extract_date_from_filename, aliases_file, load_aliases
+
+
+EXP_SETTING = "Harvard"
+assert EXP_SETTING in ["LM", "Harvard"]
+RAW_COUNTS_FILE = f'./result/{EXP_SETTING}/raw_counts.jsonl'
+OUTPUT_STORE = f'./result/{EXP_SETTING}/scores'
+
+SCHEMES = ['tfidf', 'lm', 'bm25', 'binary', 'log_tf', 'term_weights']
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def load_counts(path=RAW_COUNTS_FILE):
+    """Return (meta DataFrame, CSR count matrix, doc_length vector, n_unique vector, vocabulary list)."""
+    meta = []
+    doc_length = []
+    n_unique = []
+    rows, cols, vals = [], [], []
+    vocab = {}
+    with open(path, 'r') as f_in:
+        for i, line in enumerate(f_in):
+            record = json.loads(line)
+            meta.append((record['filename'], record['cik'], record['file_date']))
+            doc_length.append(record['doc_length'])
+            n_unique.append(record.get('n_unique', np.nan))  # NaN for raw counts saved before n_unique
+            for word, count in record['counts'].items():
+                rows.append(i)
+                cols.append(vocab.setdefault(word, len(vocab)))
+                vals.append(count)
+    counts = sp.csr_matrix((np.array(vals, dtype=float), (rows, cols)), shape=(len(meta), len(vocab)))
+    counts.sum_duplicates()
+    meta = pd.DataFrame(meta, columns=['filename', 'cik', 'file_date'])
+    return meta, counts, np.array(doc_length, dtype=float), np.array(n_unique, dtype=float), list(vocab)
+
+
+def _row_of_nonzeros(counts):
+    # document index of every stored entry in a CSR matrix
+    return np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+
+
+def _with_data(counts, data):
+    # same sparsity pattern as counts, new values
+    return sp.csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+
+def _safe_divide(num, den):
+    out = np.zeros_like(num, dtype=float)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def score_tfidf(counts, doc_length, df, n_docs, n_unique):
+    idf = np.log(n_docs / (df + 1))
+    tf = _with_data(counts, _safe_divide(counts.data, doc_length[_row_of_nonzeros(counts)]))
+    return np.asarray(tf @ idf).ravel()
+
+
+def score_lm(counts, doc_length, df, n_docs, n_unique):
+    idf = np.log(n_docs / np.maximum(df, 1))
+    avg_tf = _safe_divide(doc_length, n_unique)
+    if np.isnan(n_unique).any():  # raw counts saved before n_unique: re-parse to score them
+        print(f'  {int(np.isnan(n_unique).sum()):,} documents have no n_unique; their lm score is NaN')
+        avg_tf[np.isnan(n_unique)] = np.nan
+    den = 1 + np.log(np.maximum(avg_tf, 1))
+    weight = (1 + np.log(counts.data)) / den[_row_of_nonzeros(counts)]
+    return np.asarray(_with_data(counts, weight) @ idf).ravel()
+
+
+def score_bm25(counts, doc_length, df, n_docs, n_unique):
+    idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+    avg_length = max(doc_length.mean(), 1) if len(doc_length) else 1
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length / avg_length)
+    tf = counts.data
+    weight = tf * (BM25_K1 + 1) / (tf + norm[_row_of_nonzeros(counts)])
+    return np.asarray(_with_data(counts, weight) @ idf).ravel()
+
+
+def score_binary(counts, doc_length, df, n_docs, n_unique):
+    return np.diff(counts.indptr).astype(float)
+
+
+def score_log_tf(counts, doc_length, df, n_docs, n_unique):
+    return np.asarray(_with_data(counts, 1 + np.log(counts.data)).sum(axis=1)).ravel()
+
+
+def score_term_weights(counts, doc_length, df, n_docs, n_unique):
+    return _safe_divide(np.asarray(counts.sum(axis=1)).ravel(), doc_length)
+
+
+SCORERS = {
+    'tfidf': score_tfidf,
+    'lm': score_lm,
+    'bm25': score_bm25,
+    'binary': score_binary,
+    'log_tf': score_log_tf,
+    'term_weights': score_term_weights,
+}
+
+
+def fan_out(meta, aliases):
+    """Append a copy of each canonical filing's row for every alias (own filename, cik, file_date)."""
+    rows = [(i, alias) for i, fname in enumerate(meta['filename']) for alias in aliases.get(fname, [])]
+    if not rows:
+        return meta
+    copies = meta.iloc[[i for i, _ in rows]].copy()
+    copies['filename'] = [alias for _, alias in rows]
+    copies['cik'] = [extract_cik_from_filename(alias) for _, alias in rows]
+    copies['file_date'] = [extract_date_from_filename(alias) for _, alias in rows]
+    return pd.concat([meta, copies], ignore_index=True)
+
+
+def rescore(schemes=SCHEMES, path=RAW_COUNTS_FILE):
+    """Score every document under each scheme; returns meta columns plus one column per scheme."""
+    meta, counts, doc_length, n_unique, vocab = load_counts(path)
+    counts.eliminate_zeros()
+    n_docs = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1]).astype(float)
+    print(f'{n_docs:,} documents | {len(vocab):,} lexicon words observed')
+    for scheme in schemes:
+        meta[scheme] = SCORERS[scheme](counts, doc_length, df, n_docs, n_unique)
+    policy, aliases = load_aliases(aliases_file(path))
+    if policy == 'fanout':
+        meta = fan_out(meta, aliases)
+    return meta
+
+
+if __name__ == '__main__':
+    print('\n' + time.strftime('%c') + f'\n{sys.argv[0]}\n')
+    df_scores = rescore()
+    RS.write_results(df_scores, OUTPUT_STORE, mode='replace')  # idf is corpus-wide; see Result_Store
+    print(f'Scores written to {OUTPUT_STORE}: {", ".join(SCHEMES)}')
+    print('\n' + time.strftime('%c') + '\nNormal termination.')
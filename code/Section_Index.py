@@ -0,0 +1,161 @@
+"""
+One-time index of the standard Item sections in 10-K / 10-Q filings.
+  index_file(filename) scans a filing once for PART / ITEM headers and records the byte
+  offsets [start, end) of every item.  build_index(file_list) does this for the corpus and
+  stores the result in SECTION_INDEX_FILE, so section-level studies (e.g., only MD&A or Risk
+  Factors) can seek straight to the requested bytes with read_sections() instead of
+  re-reading and re-scanning each filing on every experiment.
+
+  Items are keyed by number for 10-K ('1A', '7', ...) and by part and number for 10-Q
+  ('I-2', 'II-1A', ...) since 10-Q items repeat across parts.  The table of contents ends at the
+  first header that repeats; each item's section is its first header after that, running to the
+  next section or PART header.  Offsets are into the raw file, so for HTML filings a section's
+  bytes include its markup, as whole filings do.
+"""
+
+import bisect
+import glob
+import json
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+from tqdm import tqdm
+
+
+TARGET_FILES = r'./data/*/*/*.txt'
+SECTION_INDEX_FILE = r'./result/section_index.json'
+
+# Named sections by form type -> item key
+SECTION_ITEMS = {
+    '10-K': {'business': '1', 'risk_factors': '1A', 'properties': '2', 'legal_proceedings': '3',
+             'mdna': '7', 'market_risk': '7A', 'financial_statements': '8', 'controls': '9A'},
+    '10-Q': {'financial_statements': 'I-1', 'mdna': 'I-2', 'market_risk': 'I-3', 'controls': 'I-4',
+             'legal_proceedings': 'II-1', 'risk_factors': 'II-1A'},
+}
+
+# Headers start a block: a plain-text line, or an HTML/iXBRL paragraph, cell or line break, possibly
+#   inside inline tags ('<p><b>Item&#160;7.</b>', '<div><span>ITEM 7.</span>').  An 'Item 7A' that
+#   follows text in the same block ('...discussed in Part II, <i>Item 7A</i>') is a cross-reference.
+#   Whitespace, non-breaking-space entities and tags may separate the words of a header.
+_SPACE = rb'(?:[ \t]|&nbsp;|&#160;|&#xa0;)'
+_GAP = rb'(?:\s|&nbsp;|&#160;|&#xa0;|<[^<>]{0,300}>)'
+_BLOCK_TAG = rb'<(?:p|div|td|th|li|tr|br|h[1-6])\b[^<>]{0,300}>'
+_INLINE_TAG = rb'</?(?:span|font|b|strong|i|em|u|a|ix:[a-z]+)\b[^<>]{0,300}>'
+HEADER_RE = re.compile(rb'(?:^|' + _BLOCK_TAG + rb')(?:' + _SPACE + rb'|\s|' + _INLINE_TAG + rb')*' +
+                       rb'(?P<header>PART' + _GAP + rb'+(IV|III|II|I)\b|ITEM' + _GAP + rb'+(\d{1,2}[A-C]?)\b)',
+                       re.IGNORECASE | re.MULTILINE)
+
+_index_cache = {}
+
+
+def form_of(filename):
+    # Filing names look like 20200124_10-Q_edgar_data_4127_0000004127-20-000007_1.txt
+    form = os.path.basename(filename).split('_')[1]
+    return '10-Q' if form.startswith('10-Q') else '10-K'
+
+
+def index_file(filename):
+    """Return {item key: [start, end]} byte offsets for one filing."""
+    with open(filename, 'rb') as f_in:
+        doc = f_in.read()
+    quarterly = form_of(filename) == '10-Q'
+
+    headers = []  # (offset, key); key None for PART headers
+    part = None
+    for match in HEADER_RE.finditer(doc):
+        if match.group(2):
+            part = match.group(2).upper().decode()
+            headers.append((match.start('header'), None))
+        else:
+            item = match.group(3).upper().decode()
+            key = f'{part}-{item}' if quarterly and part else item
+            headers.append((match.start('header'), key))
+
+    # The table of contents ends where an item header repeats (no repeat: no table of contents)
+    seen = set()
+    body_start = 0
+    for start, key in headers:
+        if key in seen:
+            body_start = start
+            break
+        if key is not None:
+            seen.add(key)
+
+    # First occurrence in the body, else (an item listed only once) the first occurrence anywhere
+    starts = {}
+    for start, key in headers:
+        if key is not None and start >= body_start:
+            starts.setdefault(key, start)
+    for start, key in headers:
+        if key is not None:
+            starts.setdefault(key, start)
+
+    # A section runs to the next section or PART header, so unused matches can't cut it short
+    bounds = sorted(set(starts.values()) | {start for start, key in headers if key is None and start >= body_start})
+    sections = {}
+    for key, start in starts.items():
+        i = bisect.bisect_right(bounds, start)
+        sections[key] = [start, bounds[i] if i < len(bounds) else len(doc)]
+    return sections
+
+
+def _index_one(filename):
+    try:
+        return os.path.basename(filename), index_file(filename)
+    except Exception as e:
+        print(f"Error indexing {filename}: {e}")
+        return os.path.basename(filename), None
+
+
+def load_index(path=SECTION_INDEX_FILE):
+    """Section index as {filename: {item key: [start, end]}}; cached per process."""
+    if path not in _index_cache:
+        if os.path.exists(path):
+            with open(path, 'r') as f_in:
+                _index_cache[path] = json.load(f_in)
+        else:
+            _index_cache[path] = {}
+    return _index_cache[path]
+
+
+def build_index(file_list, path=SECTION_INDEX_FILE):
+    """Index every filing in file_list not already in the stored index, then save it."""
+    index = load_index(path)
+    todo = [f for f in file_list if os.path.basename(f) not in index]
+    print(f"Indexing {len(todo)} of {len(file_list)} files")
+    with mp.Pool(processes=mp.cpu_count()) as pool:
+        for fname, sections in tqdm(pool.imap_unordered(_index_one, todo), total=len(todo)):
+            if sections is not None:
+                index[fname] = sections
+    with open(path, 'w') as f_out:
+        json.dump(index, f_out)
+    return index
+
+
+def read_sections(filename, sections, path=SECTION_INDEX_FILE):
+    """
+    Text of the named sections (e.g., ['mdna', 'risk_factors']) of one filing, read by seeking to
+      their indexed byte offsets.  Filings missing from the index (e.g., just downloaded in
+      pipeline mode) are scanned on the fly.  Returns None if the filing has none of them.
+    """
+    offsets = load_index(path).get(os.path.basename(filename))
+    if offsets is None:
+        offsets = index_file(filename)
+    items = SECTION_ITEMS[form_of(filename)]
+    spans = sorted(offsets[items[name]] for name in sections if items.get(name) in offsets)
+    if not spans:
+        return None
+    parts = []
+    with open(filename, 'rb') as f_in:
+        for start, end in spans:
+            f_in.seek(start)
+            parts.append(f_in.read(end - start))
+    return b'\n'.join(parts).decode('UTF-8', errors='ignore')
+
+
+if __name__ == '__main__':
+    print('\n' + time.strftime('%c') + f'\n{sys.argv[0]}\n')
+    build_index(glob.glob(TARGET_FILES))
+    print('\n' + time.strftime('%c') + '\nNormal termination.')
@@ -1,10 +1,15 @@
-import wrds
-from tqdm import tqdm
-import pandas as pd
 import numpy as np
 from datetime import timedelta, datetime
 
+# pandas, Event_Study and Result_Store (pyarrow) are imported where they are used, like wrds, so
+#   importing this module (e.g., from Pipeline_CLI) stays fast
+
+SETTINGS = ['Harvard', 'LM']
+# Factor model for car_ff_*: ff.factors_daily columns, e.g. add 'umd' for Carhart; None for market model only
+FACTOR_MODEL = ['mktrf', 'smb', 'hml']
+
 def get_excess_returns(cik, release_date, wrds_conn):
+    import pandas as pd
     if not release_date:
         return None, None
 
@@ -64,18 +69,106 @@ def get_excess_returns(cik, release_date, wrds_conn):
         print(f"fail to query: CIK {cik}, date {release_date}, Error: {e}")
         return None, None
 
-db = wrds.Connection()
-
-for SETTING in ['Harvard', 'LM']:
-    result_file = f"result/{SETTING}/result.csv"
-    df = pd.read_csv(result_file)
-    for index, row in tqdm(df.iterrows()):
-        cik = str(row['cik'])
-        cik = '0' * (10-len(cik)) + cik
-        release_date = row['file_date']
-        ret_3day, ret_4day = get_excess_returns(cik, release_date, db)
-        df.at[index, 'ret_3day'] = ret_3day
-        df.at[index, 'ret_4day'] = ret_4day
-    df.to_csv(f"result/{SETTING}/result_with_excess.csv", index=False)
-
-db.close()
+def get_daily_panel(ciks, start_date, end_date, wrds_conn):
+    """
+    One query for the daily returns of every CIK over [start_date, end_date].
+      Returns (returns: dates x cik, market: DataFrame with ewretd) for Event_Study.
+    """
+    cik_list = ", ".join(f"'{cik}'" for cik in sorted(set(ciks)))
+    query = f"""
+        SELECT l.cik, a.permno, a.date, a.ret, b.ewretd
+        FROM crsp.dsf AS a
+        JOIN crsp.dsi AS b ON a.date = b.date
+        JOIN crsp.ccmxpf_linktable AS c ON a.permno = c.lpermno
+        JOIN (SELECT DISTINCT gvkey, cik FROM crsp.ccm_lookup WHERE cik IN ({cik_list})) AS l
+          ON c.gvkey = l.gvkey
+        WHERE c.linkprim = 'P'
+        AND c.linktype IN ('LU', 'LC')
+        AND a.date BETWEEN '{start_date}' AND '{end_date}'
+    """
+    data = wrds_conn.raw_sql(query, date_cols=['date'])
+    # A CIK can map to several primary permnos (share classes, relinked gvkeys); use the one with the
+    #   longest return history in the window for all of its dates, never a mix of securities
+    n_obs = data.groupby(['cik', 'permno']).size().reset_index(name='n_obs')
+    n_obs = n_obs.sort_values(['cik', 'n_obs', 'permno'], ascending=[True, False, True]).drop_duplicates('cik')
+    data = data.merge(n_obs[['cik', 'permno']], on=['cik', 'permno']).drop_duplicates(['cik', 'date'])
+    returns = data.pivot(index='date', columns='cik', values='ret').sort_index()
+    market = data.drop_duplicates('date').set_index('date')[['ewretd']].reindex(returns.index)
+    return returns, market
+
+
+def get_factors(start_date, end_date, wrds_conn, factor_model=None):
+    """Daily Fama-French factors and rf (ff.factors_daily) over [start_date, end_date], indexed by date."""
+    columns = ", ".join((factor_model or FACTOR_MODEL) + ['rf'])
+    query = f"""
+        SELECT date, {columns}
+        FROM ff.factors_daily
+        WHERE date BETWEEN '{start_date}' AND '{end_date}'
+    """
+    return wrds_conn.raw_sql(query, date_cols=['date']).set_index('date').sort_index()
+
+
+def event_return_columns(factor_model=FACTOR_MODEL):
+    import Event_Study as ES
+    columns = [f'ret_{window[1] - window[0] + 1}day' for window in ES.CAR_WINDOWS]
+    for model in ['mm'] + (['ff'] if factor_model else []):
+        columns += [f'car_{model}_{window[0]}_{window[1]}' for window in ES.CAR_WINDOWS]
+    return columns
+
+
+def get_event_returns(df, wrds_conn, factor_model=FACTOR_MODEL):
+    """
+    Returns around every filing in df from one daily panel query, over Event_Study.CAR_WINDOWS:
+      ret_<n>day       buy-and-hold return minus the ewretd buy-and-hold return (ret_3day, ret_4day)
+      car_mm_<window>  market-model (ewretd) CAR
+      car_ff_<window>  factor-model CAR on factor_model (excess returns over rf); None skips it
+    """
+    import pandas as pd
+    import Event_Study as ES
+    out = pd.DataFrame(index=df.index, columns=event_return_columns(factor_model), dtype=float)
+    if df.empty:
+        return out
+    ciks = df['cik'].astype(str).str.zfill(10)
+    dates = pd.to_datetime(df['file_date'])
+    # calendar-day padding so the trading-day windows are covered
+    start_date = (dates.min() + timedelta(days=int(ES.EST_WINDOW[0] * 1.6) - 10)).date()
+    end_date = (dates.max() + timedelta(days=int(max(w[1] for w in ES.CAR_WINDOWS) * 1.6) + 10)).date()
+    returns, market = get_daily_panel(ciks, start_date, end_date, wrds_conn)
+    if returns.empty:
+        print("can't find any of the CIKs in CRSP")
+        return out
+
+    bhar = ES.buy_and_hold_excess(returns, market['ewretd'], ciks, dates)
+    cars = {'mm': ES.abnormal_returns(returns, market, ciks, dates)}
+    if factor_model:
+        factors = get_factors(start_date, end_date, wrds_conn, factor_model).reindex(returns.index)
+        cars['ff'] = ES.abnormal_returns(returns, factors[factor_model], ciks, dates, rf=factors['rf'])
+    for window in ES.CAR_WINDOWS:
+        name = f'{window[0]}_{window[1]}'
+        out[f'ret_{window[1] - window[0] + 1}day'] = bhar[f'bhar_{name}'].to_numpy()
+        for model, model_cars in cars.items():
+            out[f'car_{model}_{name}'] = model_cars[f'car_{name}'].to_numpy()
+    return out
+
+
+def get_wrds_connection():
+    import wrds  # slow to import and connects to WRDS, so only when returns are actually needed
+    return wrds.Connection()
+
+
+def main(settings=SETTINGS):
+    import Result_Store as RS
+    db = get_wrds_connection()
+    for SETTING in settings:
+        df = RS.read_results(f"result/{SETTING}/result")  # cik already zero-padded
+        # one panel query for all filings instead of a query per filing (get_excess_returns)
+        event_returns = get_event_returns(df, db)
+        for column in event_returns.columns:
+            df[column] = event_returns[column]
+        # df is the whole result store, scores included (corpus-wide idf), so replace it all
+        RS.write_results(df, f"result/{SETTING}/result_with_excess", mode='replace')
+    db.close()
+
+
+if __name__ == '__main__':
+    main()